@@ -23,18 +23,47 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from collections import OrderedDict
+from collections import namedtuple, OrderedDict
 import datetime
+from functools import lru_cache
 import matplotlib.pyplot as plt
 import numpy as np
+import threading
 import time
 
 from core.connector import Connector
+from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
 from core.util.mutex import Mutex
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
 
+try:
+    from fastrlock.rlock import FastRLock
+except ImportError:
+    FastRLock = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+class ScanWorker(QtCore.QObject):
+    """ Runs the repeats of a laser scan in its own thread. The scan loop therefore does not need
+    to go through the Qt event loop for every line and the logic can still react to a stop
+    request in the meantime.
+    """
+
+    def __init__(self, parentclass):
+        super().__init__()
+        self._parentclass = parentclass
+
+    @QtCore.Slot()
+    def run(self):
+        """ Perform the scan prepared by the laser scanner logic. """
+        self._parentclass._run_scan()
+
 
 class LaserScannerLogic(GenericLogic):
 
@@ -48,6 +77,18 @@ class LaserScannerLogic(GenericLogic):
     confocalscanner1 = Connector(interface='ConfocalScannerInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # scan ranges for which the ramps are precalculated
+    _preseed_ranges = ConfigOption('preseed_ranges', [[-1, 1], [-5, 5], [0, 10]])
+    # ramps with more points than this are never calculated ahead of a scan
+    _max_precalculated_ramp_points = ConfigOption('max_precalculated_ramp_points', 100000)
+    # scan all repeats in a single hardware call. The plots are then only updated at the end and
+    # a scan can not be stopped early.
+    _batch_scan_lines = ConfigOption('batch_scan_lines', False)
+    # save the data arrays as compressed binary npz files instead of text files
+    _save_binary = ConfigOption('save_binary', True)
+    # ramp back to the static voltage when a scan is stopped early
+    _return_to_static_on_stop = ConfigOption('return_to_static_on_stop', True)
+
     scan_range = StatusVar('scan_range', [-10, 10])
     number_of_repeats = StatusVar(default=10)
     resolution = StatusVar('resolution', 500)
@@ -56,7 +97,7 @@ class LaserScannerLogic(GenericLogic):
 
     sigChangeVoltage = QtCore.Signal(float)
     sigVoltageChanged = QtCore.Signal(float)
-    sigScanNextLine = QtCore.Signal()
+    sigRunScan = QtCore.Signal()
     sigUpdatePlots = QtCore.Signal()
     sigScanFinished = QtCore.Signal()
     sigScanStarted = QtCore.Signal()
@@ -68,10 +109,17 @@ class LaserScannerLogic(GenericLogic):
         """
         super().__init__(**kwargs)
 
-        # locking for thread safety
-        self.threadlock = Mutex()
-        self.stopRequested = False
-
+        # locking for thread safety. The lock is practically never contended, so use the
+        # lightweight FastRLock if it is available.
+        self.threadlock = Mutex() if FastRLock is None else FastRLock()
+        self._stop_event = threading.Event()
+
+        self._ramp_cache = dict()
+        self._scan_line_buffers = dict()
+        # spatial scanner position, only valid while a scan is running
+        self._xyz_cached = None
+        self.scan_matrix = None
+        self.scan_matrix2 = None
         self.fit_x = []
         self.fit_y = []
         self.plot_x = []
@@ -100,17 +148,23 @@ class LaserScannerLogic(GenericLogic):
 
         # Sets connections between signals and functions
         self.sigChangeVoltage.connect(self._change_voltage, QtCore.Qt.QueuedConnection)
-        self.sigScanNextLine.connect(self._do_next_line, QtCore.Qt.QueuedConnection)
+
+        # create an independent thread running the scan loop
+        self._scan_thread = QtCore.QThread()
+        self._scan_worker = ScanWorker(self)
+        self._scan_worker.moveToThread(self._scan_thread)
+        self.sigRunScan.connect(self._scan_worker.run, QtCore.Qt.QueuedConnection)
+        self._scan_thread.start()
 
         # Initialization of internal counter for scanning
         self._scan_counter_up = 0
         self._scan_counter_down = 0
-        # Keep track of scan direction
-        self.upwards_scan = True
-
         # calculated number of points in a scan, depends on speed and max step size
         self._num_of_steps = 50  # initialising.  This is calculated for a given ramp.
 
+        # minimum time between plot updates during a scan
+        self._plot_update_interval = 0.1  # seconds
+
         #############################
 
         # TODO: allow configuration with respect to measurement duration
@@ -118,21 +172,34 @@ class LaserScannerLogic(GenericLogic):
 
         # default values for clock frequency and slowness
         # slowness: steps during retrace line
+        self._smoothing_steps = 10  # steps to accelerate between 0 and scan_speed
         self.set_resolution(self.resolution)
         self._goto_speed = 10  # 0.01  # volt / second
         self.set_scan_speed(self._scan_speed)
-        self._smoothing_steps = 10  # steps to accelerate between 0 and scan_speed
         self._max_step = 0.01  # volt
 
         ##############################
 
-        # Initialie data matrix
-        self._initialise_data_matrix(100)
+        # Initialie data matrix with the length of the configured scan ramp, unless that ramp is
+        # too long to calculate ahead of a scan. start_scanning resizes it anyway.
+        scan_length = 100
+        if (self._estimate_ramp_length(self.scan_range[0], self.scan_range[1], self._scan_speed)
+                <= self._max_precalculated_ramp_points):
+            ramp, _ = _build_ramp_array(
+                *self._ramp_key(self.scan_range[0], self.scan_range[1], self._scan_speed))
+            scan_length = ramp.size
+        self._initialise_data_matrix(scan_length)
+
+        # Precalculate the ramps of the preset scan ranges
+        self._preseed_ramp_cache()
 
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
-        self.stopRequested = True
+        self._stop_event.set()
+        self._scan_thread.quit()
+        self._scan_thread.wait()
+        self.sigRunScan.disconnect()
 
     @QtCore.Slot(float)
     def goto_voltage(self, volts=None):
@@ -163,8 +230,10 @@ class LaserScannerLogic(GenericLogic):
         """
         ramp_scan = self._generate_ramp(self.get_current_voltage(), new_voltage, self._goto_speed)
         self._initialise_scanner()
-        ignored_counts = self._scan_line(ramp_scan)
-        self._close_scanner()
+        try:
+            ignored_counts = self._scan_line(ramp_scan)
+        finally:
+            self._close_scanner()
         self.sigVoltageChanged.emit(new_voltage)
         return 0
 
@@ -222,8 +291,16 @@ class LaserScannerLogic(GenericLogic):
     def _initialise_data_matrix(self, scan_length):
         """ Initializing the ODMR matrix plot. """
 
-        self.scan_matrix = np.zeros((self.number_of_repeats, scan_length))
-        self.scan_matrix2 = np.zeros((self.number_of_repeats, scan_length))
+        # Reuse the existing buffers if the scan geometry did not change
+        shape = (self.number_of_repeats, scan_length)
+        if self.scan_matrix is not None and self.scan_matrix.shape == shape:
+            self.scan_matrix[...] = 0
+            self.scan_matrix2[...] = 0
+        else:
+            # The scanner returns count rates, single precision is sufficient for them and halves
+            # the memory of the matrices.
+            self.scan_matrix = np.zeros(shape, dtype=np.float32)
+            self.scan_matrix2 = np.zeros(shape, dtype=np.float32)
         self.plot_x = np.linspace(self.scan_range[0], self.scan_range[1], scan_length)
         self.plot_y = np.zeros(scan_length)
         self.plot_y2 = np.zeros(scan_length)
@@ -264,6 +341,9 @@ class LaserScannerLogic(GenericLogic):
 
         self.current_position = self._scanning_device.get_scanner_position()
         print(self.current_position)
+        # The spatial position does not change during the scan, no need to ask the hardware for
+        # every ramp.
+        self._xyz_cached = np.asarray(self.current_position[0:3], dtype=np.float64)
 
         if v_min is not None:
             self.scan_range[0] = v_min
@@ -276,11 +356,10 @@ class LaserScannerLogic(GenericLogic):
 
         self._scan_counter_up = 0
         self._scan_counter_down = 0
-        self.upwards_scan = True
 
         # TODO: Generate Ramps
-        self._upwards_ramp = self._generate_ramp(v_min, v_max, self._scan_speed)
-        self._downwards_ramp = self._generate_ramp(v_max, v_min, self._scan_speed)
+        self._upwards_ramp = self._generate_ramp(v_min, v_max, self._scan_speed, 'upwards')
+        self._downwards_ramp = self._generate_ramp(v_max, v_min, self._scan_speed, 'downwards')
 
         self._initialise_data_matrix(len(self._upwards_ramp[3]))
 
@@ -288,9 +367,12 @@ class LaserScannerLogic(GenericLogic):
         returnvalue = self._initialise_scanner()
         if returnvalue < 0:
             # TODO: error message
+            self._xyz_cached = None
             return -1
 
-        self.sigScanNextLine.emit()
+        # Discard stop requests that arrived after the last scan had already finished
+        self._stop_event.clear()
+        self.sigRunScan.emit()
         self.sigScanStarted.emit()
         return 0
 
@@ -299,51 +381,83 @@ class LaserScannerLogic(GenericLogic):
 
         @return int: error code (0:OK, -1:error)
         """
-        with self.threadlock:
-            if self.module_state() == 'locked':
-                self.stopRequested = True
+        # Only the scan loop reads the stop flag and start_scanning resets it, setting it needs
+        # no additional lock
+        if self.module_state() == 'locked':
+            self._stop_event.set()
         return 0
 
     def _close_scanner(self):
         """Close the scanner and unlock"""
         with self.threadlock:
             self.kill_scanner()
-            self.stopRequested = False
+            self._xyz_cached = None
             if self.module_state.can('unlock'):
                 self.module_state.unlock()
 
-    def _do_next_line(self):
-        """ If stopRequested then finish the scan, otherwise perform next repeat of the scan line
+    def _run_scan(self):
+        """ Perform all repeats of the scan line until they are done or a stop is requested, then
+        return to the static voltage. Runs in the thread of the scan worker.
         """
-        # stops scanning
-        if self.stopRequested or self._scan_counter_down >= self.number_of_repeats:
+        try:
+            # move from current voltage to start of scan range.
+            self._goto_during_scan(self.scan_range[0])
+
+            if self._batch_scan_lines:
+                trace, retrace = self._scan_all_lines(
+                    self._upwards_ramp, self._downwards_ramp, self.number_of_repeats)
+                np.copyto(self.scan_matrix, trace)
+                np.copyto(self.scan_matrix2, retrace)
+                self.plot_y += trace.sum(axis=0)
+                self.plot_y2 += retrace.sum(axis=0)
+                self._scan_counter_up = self.number_of_repeats
+                self._scan_counter_down = self.number_of_repeats
+            else:
+                last_update = time.time()
+                for i in range(self.number_of_repeats):
+                    if self._stop_event.is_set():
+                        break
+                    counts = self._scan_line(self._upwards_ramp)
+                    np.copyto(self.scan_matrix[i], counts)
+                    self.plot_y += counts
+                    self._scan_counter_up += 1
+
+                    if self._stop_event.is_set():
+                        break
+                    counts = self._scan_line(self._downwards_ramp)
+                    np.copyto(self.scan_matrix2[i], counts)
+                    self.plot_y2 += counts
+                    self._scan_counter_down += 1
+
+                    if time.time() - last_update >= self._plot_update_interval:
+                        self.sigUpdatePlots.emit()
+                        last_update = time.time()
+
+            self.sigUpdatePlots.emit()
             print(self.current_position)
-            self._goto_during_scan(self._static_v)
+            if self._return_to_static_on_stop or not self._stop_event.is_set():
+                self._goto_during_scan(self._static_v)
+        finally:
             self._close_scanner()
             self.sigScanFinished.emit()
-            return
 
-        if self._scan_counter_up == 0:
-            # move from current voltage to start of scan range.
-            self._goto_during_scan(self.scan_range[0])
+    def _scan_all_lines(self, ramp_up, ramp_down, n_repeats):
+        """ Scan all repeats of trace and retrace in a single hardware call.
 
-        if self.upwards_scan:
-            counts = self._scan_line(self._upwards_ramp)
-            self.scan_matrix[self._scan_counter_up] = counts
-            self.plot_y += counts
-            self._scan_counter_up += 1
-            self.upwards_scan = False
-        else:
-            counts = self._scan_line(self._downwards_ramp)
-            self.scan_matrix2[self._scan_counter_down] = counts
-            self.plot_y2 += counts
-            self._scan_counter_down += 1
-            self.upwards_scan = True
+        @param float[4][N] ramp_up: scan line of the trace
+        @param float[4][N] ramp_down: scan line of the retrace
+        @param int n_repeats: number of trace and retrace pairs
 
-        self.sigUpdatePlots.emit()
-        self.sigScanNextLine.emit()
+        @return tuple(numpy.ndarray, numpy.ndarray): trace and retrace counts, each of shape
+                                                      (n_repeats, N)
+        """
+        ramp_length = ramp_up.shape[1]
+        all_lines = np.tile(np.hstack((ramp_up, ramp_down)), n_repeats)
+        counts = self._scan_line(all_lines)
+        counts = np.reshape(counts, (n_repeats, 2, ramp_length))
+        return counts[:, 0, :], counts[:, 1, :]
 
-    def _generate_ramp(self, voltage1, voltage2, speed):
+    def _generate_ramp(self, voltage1, voltage2, speed, buffer_name=None):
         """Generate a ramp vrom voltage1 to voltage2 that
         satisfies the speed, step, smoothing_steps parameters.  Smoothing_steps=0 means that the
         ramp is just linear.
@@ -351,73 +465,117 @@ class LaserScannerLogic(GenericLogic):
         @param float voltage1: voltage at start of ramp.
 
         @param float voltage2: voltage at end of ramp.
+
+        @param str buffer_name: optional, name of a persistent scan line buffer to write the ramp
+                                into. The returned scan line is then only valid until the next
+                                ramp is generated with the same buffer_name.
         """
 
         # It is much easier to calculate the smoothed ramp for just one direction (upwards),
         # and then to reverse it if a downwards ramp is required.
 
-        v_min = min(voltage1, voltage2)
-        v_max = max(voltage1, voltage2)
+        key = self._ramp_key(min(voltage1, voltage2), max(voltage1, voltage2), speed)
+        # A single lookup, the cache may be replaced from the logic thread while scanning
+        entry = self._ramp_cache.get(key)
+        if entry is None:
+            entry = _build_ramp_array(*key)
+        ramp, smoothed = entry
 
-        if v_min == v_max:
-            ramp = np.array([v_min, v_max])
-        else:
-            # These values help simplify some of the mathematical expressions
-            linear_v_step = speed / self._clock_frequency
-            smoothing_range = self._smoothing_steps + 1
+        if not smoothed:
+            self.log.warning(
+                'Voltage ramp too short to apply the '
+                'configured smoothing_steps. A simple linear ramp '
+                'was created instead.')
 
-            # Sanity check in case the range is too short
+        # Reverse if downwards ramp is required
+        if voltage2 < voltage1:
+            ramp = ramp[::-1]
 
-            # The voltage range covered while accelerating in the smoothing steps
-            v_range_of_accel = sum(
-                n * linear_v_step / smoothing_range for n in range(0, smoothing_range)
-                )
+        # Put the voltage ramp into a scan line for the hardware (4-dimension)
+        if self._xyz_cached is None:
+            spatial_pos = np.asarray(self._scanning_device.get_scanner_position()[0:3])
+        else:
+            spatial_pos = self._xyz_cached
 
-            # Obtain voltage bounds for the linear part of the ramp
-            v_min_linear = v_min + v_range_of_accel
-            v_max_linear = v_max - v_range_of_accel
+        # Fill a C-contiguous buffer directly instead of stacking constant rows
+        if buffer_name is None:
+            scan_line = np.empty((4, ramp.size), dtype=np.float64)
+        else:
+            scan_line = self._get_scan_line_buffer(buffer_name, ramp.size)
+        scan_line[0:3, :] = spatial_pos[:, None]
+        scan_line[3, :] = ramp
 
-            if v_min_linear > v_max_linear:
-                self.log.warning(
-                    'Voltage ramp too short to apply the '
-                    'configured smoothing_steps. A simple linear ramp '
-                    'was created instead.')
-                num_of_linear_steps = np.rint((v_max - v_min) / linear_v_step)
-                ramp = np.linspace(v_min, v_max, num_of_linear_steps)
+        return scan_line
 
-            else:
+    def _get_scan_line_buffer(self, buffer_name, length):
+        """ Get a persistent C-contiguous (4 x length) scan line buffer, so that scan lines do not
+        need to be allocated for every scan. The buffer only grows if a longer line is required.
 
-                num_of_linear_steps = np.rint((v_max_linear - v_min_linear) / linear_v_step)
+        @param str buffer_name: name of the buffer
+        @param int length: number of points of the scan line
 
-                # Calculate voltage step values for smooth acceleration part of ramp
-                smooth_curve = np.array(
-                    [sum(
-                        n * linear_v_step / smoothing_range for n in range(1, N)
-                        ) for N in range(1, smoothing_range)
-                    ])
+        @return numpy.ndarray: view of shape (4, length) into the buffer
+        """
+        buffer = self._scan_line_buffers.get(buffer_name)
+        if buffer is None or buffer.size < 4 * length:
+            buffer = np.empty(4 * length, dtype=np.float64)
+            self._scan_line_buffers[buffer_name] = buffer
+        return buffer[:4 * length].reshape((4, length))
 
-                accel_part = v_min + smooth_curve
-                decel_part = v_max - smooth_curve[::-1]
+    def _ramp_key(self, v_min, v_max, speed):
+        """ Get the arguments identifying an upwards ramp with the current clock settings.
 
-                linear_part = np.linspace(v_min_linear, v_max_linear, num_of_linear_steps)
+        @param float v_min: voltage at start of ramp.
+        @param float v_max: voltage at end of ramp.
+        @param float speed: scan speed in volt per second.
 
-                ramp = np.hstack((accel_part, linear_part, decel_part))
+        @return tuple: arguments for _build_ramp_array, also used as key for the ramp cache.
+        """
+        return (round(float(v_min), 9),
+                round(float(v_max), 9),
+                float(speed),
+                self._clock_frequency,
+                self._smoothing_steps)
 
-        # Reverse if downwards ramp is required
-        if voltage2 < voltage1:
-            ramp = ramp[::-1]
+    def _estimate_ramp_length(self, v_min, v_max, speed):
+        """ Estimate the number of points of a ramp without calculating it.
 
-        # Put the voltage ramp into a scan line for the hardware (4-dimension)
-        spatial_pos = self._scanning_device.get_scanner_position()
+        @param float v_min: voltage at start of ramp.
+        @param float v_max: voltage at end of ramp.
+        @param float speed: scan speed in volt per second.
 
-        scan_line = np.vstack((
-            np.ones((len(ramp), )) * spatial_pos[0],
-            np.ones((len(ramp), )) * spatial_pos[1],
-            np.ones((len(ramp), )) * spatial_pos[2],
-            ramp
-            ))
+        @return int: approximate number of points of the ramp
+        """
+        return (int(round(abs(v_max - v_min) * self._clock_frequency / speed))
+                + 2 * self._smoothing_steps)
 
-        return scan_line
+    def _preseed_ramp_cache(self):
+        """ Precalculate the scan ramps of the configured preset scan ranges, so that starting a
+        scan in one of these ranges does not need to calculate the ramps.
+
+        The preset ranges are clipped to the hardware range. Presets whose ramps would be much
+        longer than the ramp of the configured scan, or longer than
+        max_precalculated_ramp_points, are skipped.
+        Skipped while a scan is running, since the new ramps could not be used by it anyway.
+        """
+        if self.module_state() == 'locked':
+            return
+        max_points = min(
+            self._max_precalculated_ramp_points,
+            4 * self._estimate_ramp_length(
+                self.scan_range[0], self.scan_range[1], self._scan_speed))
+        ramp_cache = dict()
+        for v_min, v_max in self._preseed_ranges:
+            v_min = np.clip(v_min, self.a_range[0], self.a_range[1])
+            v_max = np.clip(v_max, self.a_range[0], self.a_range[1])
+            if v_min >= v_max:
+                continue
+            if self._estimate_ramp_length(v_min, v_max, self._scan_speed) > max_points:
+                continue
+            key = self._ramp_key(v_min, v_max, self._scan_speed)
+            ramp_cache[key] = _build_ramp_array(*key)
+        # replace the whole dict at once, a running scan never sees a partially filled cache
+        self._ramp_cache = ramp_cache
 
     def _scan_line(self, line_to_scan=None):
         """do a single voltage scan from voltage1 to voltage2
@@ -434,7 +592,6 @@ class LaserScannerLogic(GenericLogic):
         except Exception as e:
             self.log.error('The scan went wrong, killing the scanner.')
             self.stop_scanning()
-            self.sigScanNextLine.emit()
             raise e
 
     def kill_scanner(self):
@@ -464,6 +621,7 @@ class LaserScannerLogic(GenericLogic):
             tag = ''
 
         self._saving_stop_time = time.time()
+        filetype = 'npz' if self._save_binary else 'text'
 
         filepath = self._save_logic.get_path_for_module(module_name='LaserScanning')
         filepath2 = self._save_logic.get_path_for_module(module_name='LaserScanning')
@@ -523,7 +681,8 @@ class LaserScannerLogic(GenericLogic):
             filelabel=filelabel,
             fmt='%.6e',
             delimiter='\t',
-            timestamp=timestamp
+            timestamp=timestamp,
+            filetype=filetype
         )
 
         self._save_logic.save_data(
@@ -534,6 +693,7 @@ class LaserScannerLogic(GenericLogic):
             fmt='%.6e',
             delimiter='\t',
             timestamp=timestamp,
+            filetype=filetype,
             plotfig=fig
         )
 
@@ -545,6 +705,7 @@ class LaserScannerLogic(GenericLogic):
             fmt='%.6e',
             delimiter='\t',
             timestamp=timestamp,
+            filetype=filetype,
             plotfig=fig2
         )
 
@@ -672,3 +833,116 @@ class LaserScannerLogic(GenericLogic):
 
         return fig
 
+
+RampSpec = namedtuple(
+    'RampSpec',
+    ['linear_v_step_per_speed', 'v_range_of_accel_per_speed', 'smooth_curve_template'])
+
+
+@lru_cache(maxsize=8)
+def _build_ramp_spec(clock_frequency, smoothing_steps):
+    """ Precalculate the parts of a ramp that only depend on the clock and smoothing settings.
+
+    All values are given per unit of scan speed, so a ramp for a given speed only needs to scale
+    them. These settings rarely change during a measurement, hence the result is cached.
+
+    @param float clock_frequency: frequency of the scanner clock.
+    @param int smoothing_steps: steps to accelerate between 0 and the scan speed.
+
+    @return RampSpec: voltage step per clock cycle, voltage range covered while accelerating and
+                      the voltage offsets of the smoothing steps, each for a speed of 1 V/s.
+    """
+    smoothing_range = smoothing_steps + 1
+    linear_v_step_per_speed = 1.0 / float(clock_frequency)
+
+    # The voltage range covered while accelerating in the smoothing steps
+    # (closed form of the arithmetic series sum(n * linear_v_step / smoothing_range)
+    # for n in range(0, smoothing_range))
+    v_range_of_accel_per_speed = linear_v_step_per_speed * smoothing_steps / 2.0
+
+    # Voltage step values for smooth acceleration part of ramp.
+    # Each value is the partial sum of n * linear_v_step / smoothing_range for n < N,
+    # i.e. N * (N - 1) / 2 * linear_v_step / smoothing_range.
+    N = np.arange(1, smoothing_range)
+    smooth_curve_template = (N * (N - 1) * 0.5) * (linear_v_step_per_speed / smoothing_range)
+    smooth_curve_template.flags.writeable = False
+
+    return RampSpec(linear_v_step_per_speed, v_range_of_accel_per_speed, smooth_curve_template)
+
+
+@lru_cache(maxsize=32)
+def _build_ramp_array(v_min, v_max, speed, clock_frequency, smoothing_steps):
+    """ Calculate an upwards voltage ramp from v_min to v_max.
+
+    The result only depends on the arguments, so it is cached to avoid recalculating identical
+    ramps for every scan line. The returned array is read-only for that reason.
+
+    @param float v_min: voltage at start of ramp.
+    @param float v_max: voltage at end of ramp.
+    @param float speed: scan speed in volt per second.
+    @param float clock_frequency: frequency of the scanner clock.
+    @param int smoothing_steps: steps to accelerate between 0 and speed.
+
+    @return tuple(numpy.ndarray, bool): the ramp and whether the smoothing could be applied.
+    """
+    smoothed = True
+    spec = _build_ramp_spec(clock_frequency, smoothing_steps)
+    # voltage step per clock cycle at full speed
+    linear_v_step = speed * spec.linear_v_step_per_speed
+
+    if v_min == v_max:
+        ramp = np.array([v_min, v_max])
+    elif smoothing_steps == 0:
+        # Without smoothing the ramp is just linear
+        num_of_linear_steps = int(round((v_max - v_min) / linear_v_step))
+        ramp = np.linspace(v_min, v_max, num_of_linear_steps)
+    else:
+        # Obtain voltage bounds for the linear part of the ramp
+        v_range_of_accel = speed * spec.v_range_of_accel_per_speed
+        v_min_linear = v_min + v_range_of_accel
+        v_max_linear = v_max - v_range_of_accel
+
+        # Sanity check in case the range is too short
+        if v_min_linear > v_max_linear:
+            smoothed = False
+            num_of_linear_steps = int(round((v_max - v_min) / linear_v_step))
+            ramp = np.linspace(v_min, v_max, num_of_linear_steps)
+
+        else:
+
+            num_of_linear_steps = int(round((v_max_linear - v_min_linear) / linear_v_step))
+
+            ramp = np.empty(2 * smoothing_steps + num_of_linear_steps, dtype=np.float64)
+            _fill_smoothed_ramp(ramp, v_min, v_max, v_min_linear, v_max_linear,
+                                spec.smooth_curve_template * speed)
+
+    ramp.flags.writeable = False
+    return ramp, smoothed
+
+
+def _fill_smoothed_ramp(ramp, v_min, v_max, v_min_linear, v_max_linear, smooth_curve):
+    """ Write a smoothed voltage ramp into a preallocated buffer.
+
+    The buffer holds the accelerating values, the linear part and the decelerating values. If
+    numba is available this function is compiled.
+
+    @param numpy.ndarray ramp: output buffer of length 2 * smoothing steps + linear steps.
+    @param float v_min: voltage at start of ramp.
+    @param float v_max: voltage at end of ramp.
+    @param float v_min_linear: voltage at start of the linear part of the ramp.
+    @param float v_max_linear: voltage at end of the linear part of the ramp.
+    @param numpy.ndarray smooth_curve: voltage offsets of the smoothing steps.
+    """
+    smoothing_steps = smooth_curve.size
+    num_of_linear_steps = ramp.size - 2 * smoothing_steps
+
+    for i in range(smoothing_steps):
+        ramp[i] = v_min + smooth_curve[i]
+        ramp[ramp.size - 1 - i] = v_max - smooth_curve[i]
+
+    ramp[smoothing_steps:smoothing_steps + num_of_linear_steps] = np.linspace(
+        v_min_linear, v_max_linear, num_of_linear_steps)
+
+
+if njit is not None:
+    _fill_smoothed_ramp = njit(cache=True)(_fill_smoothed_ramp)
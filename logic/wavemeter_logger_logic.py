@@ -110,6 +110,8 @@ class WavemeterLoggerLogic(GenericLogic):
     # config opts
     _logic_acquisition_timing = ConfigOption('logic_acquisition_timing', 20.0, missing='warn')
     _logic_update_timing = ConfigOption('logic_update_timing', 100.0, missing='warn')
+    # save the data arrays as compressed binary npz files instead of text files
+    _save_binary = ConfigOption('save_binary', True)
 
     def __init__(self, config, **kwargs):
         """ Create WavemeterLoggerLogic object with connectors.
@@ -475,6 +477,7 @@ class WavemeterLoggerLogic(GenericLogic):
         """
 
         self._saving_stop_time = time.time()
+        filetype = 'npz' if self._save_binary else 'text'
 
         filepath = self._save_logic.get_path_for_module(module_name='WavemeterLogger')
         filelabel = 'wavemeter_log_histogram'
@@ -506,6 +509,7 @@ class WavemeterLoggerLogic(GenericLogic):
                                    parameters=parameters,
                                    filelabel=filelabel,
                                    timestamp=timestamp,
+                                   filetype=filetype,
                                    fmt='%.12e')
 
         filelabel = 'wavemeter_log_wavelength'
@@ -528,6 +532,7 @@ class WavemeterLoggerLogic(GenericLogic):
                                    parameters=parameters,
                                    filelabel=filelabel,
                                    timestamp=timestamp,
+                                   filetype=filetype,
                                    fmt='%.12e')
 
         filelabel = 'wavemeter_log_counts'
@@ -550,6 +555,7 @@ class WavemeterLoggerLogic(GenericLogic):
                                    parameters=parameters,
                                    filelabel=filelabel,
                                    timestamp=timestamp,
+                                   filetype=filetype,
                                    fmt='%.12e')
 
         self.log.debug('Laser Scan saved to:\n{0}'.format(filepath))
@@ -575,6 +581,7 @@ class WavemeterLoggerLogic(GenericLogic):
                                    parameters=parameters,
                                    filelabel=filelabel,
                                    timestamp=timestamp,
+                                   filetype=filetype,
                                    plotfig=fig,
                                    fmt='%.12e')
         plt.close(fig)